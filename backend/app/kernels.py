@@ -0,0 +1,29 @@
+"""
+Numeric kernels shared by the JIT path in logic.py and the AOT build in create_dummy_model.py.
+Plain Python here; whichever caller compiles them supplies the explicit signature below.
+"""
+
+import hashlib
+
+TREND_DENSITY_SIG = "float64(int32[::1], int64, int64, float64)"
+
+
+def source_hash() -> int:
+    """
+    Hash of this file, baked into the AOT build so logic.py can detect a stale .so.
+    """
+    with open(__file__, "rb") as f:
+        return int.from_bytes(hashlib.sha256(f.read()).digest()[:8], "big") >> 1  # fits int64
+
+
+def trend_density(buf, idx, n, density):
+    """
+    Extrapolates density from the mean slope of the last 3 ring buffer entries.
+    """
+    if n < 3:
+        return 0.0
+    size = buf.shape[0]
+    last = buf[(idx - 1) % size]
+    first = buf[(idx - 3) % size]
+    predicted = density + (last - first) / 2.0 / 200.0
+    return min(max(predicted, 0.0), 1.0)
\ No newline at end of file
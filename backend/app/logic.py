@@ -1,13 +1,150 @@
-from .schemas import IngestData, SystemStatus, ZoneStatus, Alert
+from .schemas import COUNT_MAX, IngestDataMsg
+from .kernels import TREND_DENSITY_SIG, source_hash, trend_density
 from datetime import datetime
+from typing import Optional
 import numpy as np
 import os
+import glob
+import tempfile
+import threading
+import time
+import atexit
+import multiprocessing
 import joblib
+import orjson
+from numba import njit
+from sklearn.linear_model import LinearRegression
 
-# --- In-memory storage ---
-current_counts = {}
-density_history = {}  # For trend tracking (source_id -> list of counts)
+# --- Shared history storage ---
+# One ring buffer row per source in a file-backed memory map shared by all uvicorn
+# workers. Any worker may take any source's POST, so writers hold an exclusive
+# cross-process lock while they store a count and bump its index.
+ZONES = [
+    {
+        "source_id": "cam_01",
+        "zone_id": "gate_a",
+        "display_name": "Main Gate A",
+        "alert_title": "⚠️ High Risk at Main Gate A",
+        "alert_message": "Crowd density critical. Please redirect flow.",
+    },
+    {
+        "source_id": "cam_02",
+        "zone_id": "stage_front",
+        "display_name": "Stage Front",
+        "alert_title": "⚠️ High Risk at Stage Front",
+        "alert_message": "High density detected. Manage access routes.",
+    },
+]
+SOURCE_ROWS = {z["source_id"]: row for row, z in enumerate(ZONES)}
+N_SOURCES = len(SOURCE_ROWS)
 MAX_HISTORY = 10
+HISTORY_FILE_PREFIX = "crowd_density_history_"
+_IDX_BYTES = N_SOURCES * np.dtype(np.uint64).itemsize
+_BUF_BYTES = N_SOURCES * MAX_HISTORY * np.dtype(np.int32).itemsize
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so the lock only covers threads of one worker
+    fcntl = None
+
+
+def _owner_pid() -> int:
+    """
+    PID identifying this backend instance: the uvicorn supervisor (or reloader) when
+    running as a spawned worker, otherwise this process.
+    """
+    parent = multiprocessing.parent_process()
+    return parent.pid if parent is not None else os.getpid()
+
+
+def _remove_stale_history_files():
+    """
+    Deletes history files left behind by backends that are no longer running.
+    """
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), HISTORY_FILE_PREFIX + "*.bin")):
+        if os.name != "posix":
+            # os.kill(pid, 0) would terminate the process on Windows; instead rely on
+            # Windows refusing to delete a file a live backend still has open
+            try:
+                os.remove(path)
+            except (PermissionError, FileNotFoundError):
+                pass
+            continue
+        try:
+            os.kill(int(os.path.basename(path)[len(HISTORY_FILE_PREFIX):-4]), 0)
+        except ValueError:
+            continue
+        except ProcessLookupError:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        except PermissionError:
+            continue  # alive, owned by another user
+
+
+def _open_history_file():
+    """
+    Opens (creating if needed) this backend's history file.
+    Returns (path, fd, memmap, owned); owned means this process should delete it at exit.
+    CROWD_HISTORY_FILE overrides the per-instance default path.
+    """
+    path = os.environ.get("CROWD_HISTORY_FILE")
+    owned = False
+    if path is None:
+        _remove_stale_history_files()
+        path = os.path.join(tempfile.gettempdir(), f"{HISTORY_FILE_PREFIX}{_owner_pid()}.bin")
+        # Running without a supervisor means no other worker can be using the file
+        owned = multiprocessing.parent_process() is None
+
+    # Create the zero-filled file atomically so no worker ever maps a short file
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(bytes(_IDX_BYTES + _BUF_BYTES))
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass  # another worker won the race
+        finally:
+            os.remove(tmp)
+
+    fd = os.open(path, os.O_RDWR)
+    return path, fd, np.memmap(path, dtype=np.uint8, mode="r+", shape=(_IDX_BYTES + _BUF_BYTES,)), owned
+
+
+def _close_history_file():
+    """
+    Unmaps and closes the history file, then deletes it if this process owns it.
+    Closing first matters on Windows, which won't delete a file that is open or mapped.
+    """
+    _history_map._mmap.close()
+    os.close(_history_fd)
+    if _owns_history_file:
+        try:
+            os.remove(_history_path)
+        except FileNotFoundError:
+            pass
+
+
+_history_path, _history_fd, _history_map, _owns_history_file = _open_history_file()
+atexit.register(_close_history_file)
+_thread_lock = threading.Lock()
+
+# Plain ndarray views (not np.memmap) so Numba kernels accept the rows
+history_idx = np.asarray(_history_map[:_IDX_BYTES]).view(np.uint64)
+density_history = np.asarray(_history_map[_IDX_BYTES:]).view(np.int32).reshape(N_SOURCES, MAX_HISTORY)
+
+# --- Level lookup tables (indexed by summed threshold comparisons) ---
+_RISK = ("low", "medium", "high")
+_TREND = ("down", "stable", "up")
+_RISK_THRESHOLDS = np.array([0.5, 0.8])  # searchsorted over these gives the _RISK index
+_RISK_ARR = np.array(_RISK)
+_TREND_ARR = np.array(_TREND)
+
+# --- Cached /api/status response (invalidated on ingest) ---
+STATUS_TTL = 0.5  # seconds
+_STATUS_CACHE = {"ts": 0.0, "status": None, "payload": None, "version": -1}
 
 # --- Load trained ML model for prediction ---
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "crowd_predictor.pkl")
@@ -18,124 +155,168 @@ else:
     model = None
     print(f"⚠️ ML model not found at {MODEL_PATH}, using trend-based prediction")
 
+# A single-feature linear model is just a multiply-add; skip sklearn's predict() overhead
+if isinstance(model, LinearRegression):
+    _COEF = float(model.coef_[0])
+    _INTERCEPT = float(model.intercept_)
+else:
+    _COEF = _INTERCEPT = None
+
 # --- Update counts ---
-def process_new_data(data: IngestData):
+def check_ingest(data: IngestDataMsg) -> int:
     """
-    Updates the current crowd counts and maintains recent history.
+    Returns the ring buffer row for a reading.
+    Raises ValueError for unknown sources or counts that don't fit the int32 ring.
     """
-    source = data.source_id
-    count = data.data.count
-    current_counts[source] = count
+    row = SOURCE_ROWS.get(data.source_id)
+    if row is None:
+        raise ValueError(f"Unknown source_id: {data.source_id}")
+    if not 0 <= data.data.count <= COUNT_MAX:
+        raise ValueError(f"count out of range for {data.source_id}: {data.data.count}")
+    return row
 
-    # Maintain history
-    if source not in density_history:
-        density_history[source] = []
-    density_history[source].append(count)
-    if len(density_history[source]) > MAX_HISTORY:
-        density_history[source] = density_history[source][-MAX_HISTORY:]
+
+def process_new_data(data: IngestDataMsg):
+    """
+    Records the latest crowd count in the source's shared ring buffer.
+    Raises ValueError (see check_ingest) without writing anything if the reading is invalid.
+    """
+    row = check_ingest(data)
+    with _thread_lock:
+        if fcntl:
+            fcntl.flock(_history_fd, fcntl.LOCK_EX)
+        try:
+            # Store before bumping so unlocked readers never see an unwritten slot
+            idx = int(history_idx[row])
+            density_history[row, idx % MAX_HISTORY] = data.data.count
+            history_idx[row] = idx + 1
+        finally:
+            if fcntl:
+                fcntl.flock(_history_fd, fcntl.LOCK_UN)
+
+
+# --- Risk mapping ---
+def get_risk(d: float) -> str:
+    """
+    Maps a density to a risk level without branching on thresholds.
+    """
+    # int() so NumPy bools add instead of OR-ing
+    return _RISK[int(d > 0.5) + int(d > 0.8)]
 
 
 # --- Prediction logic ---
-def predict_future_risk(zone_id: str, density: float) -> str:
+# Prefer the AOT-built module from create_dummy_model.py (no JIT at all) if it was built
+# from the current kernels.py; otherwise compile eagerly at import via the explicit
+# signature, cached on disk across restarts.
+try:
+    from . import logic_kernels
+except ImportError:
+    logic_kernels = None
+
+_aot_hash = getattr(logic_kernels, "source_hash", None)
+if _aot_hash is not None and _aot_hash() == source_hash():
+    _trend_density = logic_kernels.trend_density
+else:
+    if logic_kernels is not None:
+        print("⚠️ logic_kernels is out of date with kernels.py, using JIT (re-run create_dummy_model.py)")
+    _trend_density = njit(TREND_DENSITY_SIG, cache=True, fastmath=True)(trend_density)
+
+
+def predict_future_risk(zone_id: str, density: float, h: Optional[dict]) -> str:
     """
     Predict risk using ML model if available, else fallback to trend-based prediction.
+    `h` is the zone's history snapshot {"buf", "idx", "n"} (or None if it has no data yet).
     """
     # Use ML model for gate_a
     if model and zone_id == "cam_01":
-        prev_count = density_history.get(zone_id, [])[-1] if density_history.get(zone_id) else 0
-        predicted_count = model.predict([[prev_count]])[0]
+        prev_count = h["buf"][(h["idx"] - 1) % MAX_HISTORY] if h and h["n"] else 0
+        if _COEF is not None:
+            predicted_count = _COEF * prev_count + _INTERCEPT
+        else:
+            predicted_count = model.predict([[prev_count]])[0]
         predicted_density = min(max(predicted_count / 200.0, 0.0), 1.0)
     else:
         # Trend-based fallback
-        history = np.array(density_history.get(zone_id, []))
-        if len(history) < 3:
+        if h is None or h["n"] < 3:
             return "low"
-        recent_trend = np.mean(np.diff(history[-3:]))
-        predicted_density = min(max(density + (recent_trend / 200.0), 0.0), 1.0)
-
-    # Determine risk level
-    if predicted_density > 0.8:
-        return "high"
-    elif predicted_density > 0.5:
-        return "medium"
-    else:
-        return "low"
+        predicted_density = _trend_density(h["buf"], h["idx"], h["n"], density)
 
+    return get_risk(predicted_density)
 
-def get_system_status() -> SystemStatus:
+
+def get_system_status() -> dict:
     """
-    Returns live and predicted crowd status for all zones.
+    Returns live and predicted crowd status for all zones, shaped like SystemStatus.
+    Reuses the last result for up to STATUS_TTL seconds if no new data arrived.
     """
-    # Current counts
-    gate_a_count = current_counts.get("cam_01", 0)
-    stage_count = current_counts.get("cam_02", 0)
+    # Total ingest count across all workers; changes whenever any source is written
+    version = int(history_idx.sum())
+    if version == _STATUS_CACHE["version"] and time.monotonic() - _STATUS_CACHE["ts"] < STATUS_TTL:
+        return _STATUS_CACHE["status"]
 
-    # Convert to density
-    density_a = min(gate_a_count / 200.0, 1.0)
-    density_b = min(stage_count / 200.0, 1.0)
+    status = _build_system_status()
+    _STATUS_CACHE.update(
+        ts=time.monotonic(),
+        status=status,
+        payload=orjson.dumps(status),
+        version=version,
+    )
+    return status
 
-    # Risk mapping
-    def get_risk(d):
-        if d > 0.8:
-            return "high"
-        elif d > 0.5:
-            return "medium"
-        else:
-            return "low"
 
-    # Predicted risk
-    predicted_risk_a = predict_future_risk("cam_01", density_a)
-    predicted_risk_b = predict_future_risk("cam_02", density_b)
-
-    # Trend calculation for UI
-    def get_trend(source_id):
-        hist = density_history.get(source_id, [])
-        if len(hist) < 3:
-            return "stable"
-        diff = np.mean(np.diff(hist[-3:]))
-        if diff > 2:
-            return "up"
-        elif diff < -2:
-            return "down"
-        else:
-            return "stable"
-
-    zone1 = ZoneStatus(
-        zone_id="gate_a",
-        display_name="Main Gate A",
-        density=density_a,
-        risk_level=get_risk(density_a),
-        predicted_risk_level=predicted_risk_a,
-        trend=get_trend("cam_01"),
-    )
+def get_system_status_json() -> bytes:
+    """
+    Returns the system status pre-serialized as JSON bytes.
+    """
+    get_system_status()
+    return _STATUS_CACHE["payload"]
 
-    zone2 = ZoneStatus(
-        zone_id="stage_front",
-        display_name="Stage Front",
-        density=density_b,
-        risk_level=get_risk(density_b),
-        predicted_risk_level=predicted_risk_b,
-        trend=get_trend("cam_02"),
-    )
 
-    # Alerts if risk high
+def _build_system_status() -> dict:
+    """
+    Computes live and predicted crowd status for all zones.
+    Risk and trend are scored for every zone at once over the shared ring buffers.
+    """
+    # Snapshot write indices once so every read below sees the same history
+    idx = history_idx.astype(np.int64)
+    n = np.minimum(idx, MAX_HISTORY)
+    rows = np.arange(N_SOURCES)
+
+    # Current counts -> density
+    counts = np.where(idx > 0, density_history[rows, (idx - 1) % MAX_HISTORY], 0)
+    densities = np.clip(counts / 200.0, 0.0, 1.0)
+    risks = np.take(_RISK_ARR, np.searchsorted(_RISK_THRESHOLDS, densities))
+
+    # Trend: mean change over the last 3 counts of each zone
+    last3 = density_history[rows[:, None], (idx[:, None] - np.arange(3, 0, -1)) % MAX_HISTORY]
+    diffs = np.mean(np.diff(last3, axis=1), axis=1)
+    trend_idx = np.where(n >= 3, (diffs >= -2).astype(np.intp) + (diffs > 2), 1)
+    trends = np.take(_TREND_ARR, trend_idx)
+
+    zones = []
     alerts = []
-    if zone1.risk_level == "high":
-        alerts.append(Alert(
-            id="alert_1",
-            timestamp=datetime.utcnow(),
-            zone_id="gate_a",
-            title="⚠️ High Risk at Main Gate A",
-            message="Crowd density critical. Please redirect flow."
-        ))
-
-    if zone2.risk_level == "high":
-        alerts.append(Alert(
-            id="alert_2",
-            timestamp=datetime.utcnow(),
-            zone_id="stage_front",
-            title="⚠️ High Risk at Stage Front",
-            message="High density detected. Manage access routes."
-        ))
-
-    return SystemStatus(zones=[zone1, zone2], alerts=alerts)
+    now_iso = datetime.utcnow().isoformat()  # all alerts in one response share a timestamp
+    for row, z in enumerate(ZONES):
+        density = float(densities[row])
+        h = {"buf": density_history[row], "idx": int(idx[row]), "n": int(n[row])} if idx[row] else None
+        zone = {
+            "zone_id": z["zone_id"],
+            "display_name": z["display_name"],
+            "density": density,
+            "risk_level": str(risks[row]),
+            "predicted_risk_level": predict_future_risk(z["source_id"], density, h),
+            "trend": str(trends[row]),
+        }
+        zones.append(zone)
+
+        # Alerts if risk high
+        if zone["risk_level"] == "high":
+            alerts.append({
+                "id": f"alert_{row + 1}",
+                "timestamp": now_iso,
+                "zone_id": z["zone_id"],
+                "title": z["alert_title"],
+                "message": z["alert_message"],
+            })
+
+    return {"zones": zones, "alerts": alerts}
\ No newline at end of file
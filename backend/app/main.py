@@ -1,19 +1,78 @@
-from fastapi import FastAPI
+import msgspec
+from typing import List
+from fastapi import FastAPI, HTTPException, Request, Response
 from . import schemas, logic
 
 app = FastAPI()
 
-@app.post("/api/ingest")
-def post_ingest_data(data: schemas.IngestData):
+# Keep the IngestData schema in the OpenAPI docs even though the body is decoded manually.
+# Its nested models are registered under components so the $refs resolve in /docs.
+INGEST_SCHEMA = schemas.IngestData.model_json_schema(ref_template="#/components/schemas/{model}")
+INGEST_COMPONENTS = {**INGEST_SCHEMA.pop("$defs", {}), "IngestData": INGEST_SCHEMA}
+INGEST_REF = {"$ref": "#/components/schemas/IngestData"}
+INGEST_BODY = {"requestBody": {"content": {"application/json": {"schema": INGEST_REF}}}}
+INGEST_BULK_BODY = {"requestBody": {"content": {"application/json": {"schema": {"type": "array", "items": INGEST_REF}}}}}
+
+_base_openapi = app.openapi
+
+def openapi():
+    """
+    FastAPI's generated OpenAPI schema plus the manually decoded ingest models.
+    """
+    schema = _base_openapi()
+    schema.setdefault("components", {}).setdefault("schemas", {}).update(INGEST_COMPONENTS)
+    return schema
+
+app.openapi = openapi
+
+
+def decode_body(body: bytes, type):
+    """
+    Decodes a JSON request body with msgspec, mapping failures to HTTP errors.
+    strict=False accepts the same coercions as Pydantic's lax mode (e.g. "count": "5").
+    """
+    try:
+        return msgspec.json.decode(body, type=type, strict=False)
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/ingest", openapi_extra=INGEST_BODY)
+async def post_ingest_data(request: Request):
     """
     Receives data from Person A (simulator)
     """
-    logic.process_new_data(data)
+    data = decode_body(await request.body(), schemas.IngestDataMsg)
+    try:
+        logic.process_new_data(data)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     return {"status": "ok", "source_id": data.source_id}
 
-@app.get("/api/status", response_model=schemas.SystemStatus)
+@app.post("/api/ingest/bulk", openapi_extra=INGEST_BULK_BODY)
+async def post_bulk_ingest_data(request: Request):
+    """
+    Receives a batch of readings from Person A (simulator) in one request
+    """
+    items = decode_body(await request.body(), List[schemas.IngestDataMsg])
+    # Validate every item (source and count range) before writing any of them
+    errors = []
+    for data in items:
+        try:
+            logic.check_ingest(data)
+        except ValueError as e:
+            errors.append(str(e))
+    if errors:
+        raise HTTPException(status_code=422, detail="; ".join(errors))
+    for data in items:
+        logic.process_new_data(data)
+    return {"status": "ok", "count": len(items)}
+
+@app.get("/api/status", response_model=None, responses={200: {"model": schemas.SystemStatus}})
 def get_status():
     """
     Provides data to the Frontend (Person C)
     """
-    return logic.get_system_status()
\ No newline at end of file
+    return Response(content=logic.get_system_status_json(), media_type="application/json")
\ No newline at end of file
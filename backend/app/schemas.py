@@ -1,6 +1,10 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Annotated, List, Dict, Any
+import msgspec
+
+# Counts are stored in an int32 ring buffer (see logic.py)
+COUNT_MAX = 2**31 - 1
 
 # --- Ingestion (Person A -> Person B) ---
 
@@ -13,6 +17,16 @@ class IngestData(BaseModel):
     timestamp: datetime
     data: CameraData # We'll just handle camera data for now
 
+# msgspec mirrors of the above, used to decode the /api/ingest hot path
+class CameraDataMsg(msgspec.Struct):
+    count: Annotated[int, msgspec.Meta(ge=0, le=COUNT_MAX)]
+
+class IngestDataMsg(msgspec.Struct):
+    source_id: str
+    source_type: str
+    timestamp: datetime
+    data: CameraDataMsg
+
 # --- Status (Person B -> Frontend) ---
 
 class ZoneStatus(BaseModel):
@@ -2,6 +2,8 @@ import joblib
 from sklearn.linear_model import LinearRegression
 import numpy as np
 import os
+from numba.pycc import CC
+from app.kernels import TREND_DENSITY_SIG, source_hash, trend_density
 
 print("Creating dummy ML model...")
 
@@ -15,4 +17,20 @@ dummy_model.fit(X, y)
 save_path = os.path.join(os.path.dirname(__file__), "app", "crowd_predictor.pkl")
 joblib.dump(dummy_model, save_path)
 
-print(f"✅ Dummy model saved to: {save_path}")
\ No newline at end of file
+print(f"✅ Dummy model saved to: {save_path}")
+
+# --- AOT-compile the Numba kernels so the API never JITs at startup ---
+# Note: numba.pycc is deprecated and emits NumbaPendingDeprecationWarning here.
+print("Compiling logic kernels...")
+KERNELS_HASH = source_hash()
+
+def kernels_hash():
+    return KERNELS_HASH  # frozen into the .so as a constant
+
+cc = CC("logic_kernels")
+cc.output_dir = os.path.join(os.path.dirname(__file__), "app")
+cc.export("trend_density", TREND_DENSITY_SIG)(trend_density)
+cc.export("source_hash", "int64()")(kernels_hash)
+cc.compile()
+
+print(f"✅ Logic kernels compiled to: {cc.output_dir}")
\ No newline at end of file
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import pandas as pd
+import numpy as np
 import time
 import pydeck as pdk
 from datetime import datetime
@@ -9,6 +10,7 @@ from datetime import datetime
 API_URL = "http://localhost:8000/api/status"
 REFRESH_INTERVAL = 2  # seconds
 MAX_HISTORY = 50
+LOCAL_TZ = datetime.now().astimezone().tzinfo
 # --- Coordinates for our demo zones ---
 ZONE_COORDS = {
     "gate_a": {"lat": 17.3871, "lon": 78.4917},
@@ -48,10 +50,16 @@ if "last_alert_count" not in st.session_state:
     st.session_state.last_alert_count = 0
 
 # --- Helper function to fetch data ---
+# Shared session so each poll reuses the keep-alive connection to the backend.
+# cache_resource keeps one instance across script reruns (e.g. slider moves).
+@st.cache_resource
+def _session():
+    return requests.Session()
+
 @st.cache_data(ttl=REFRESH_INTERVAL)
 def get_status():
     try:
-        res = requests.get(API_URL, timeout=1.5)
+        res = _session().get(API_URL, timeout=1.5)
         if res.status_code == 200:
             return res.json()
     except requests.exceptions.RequestException:
@@ -59,15 +67,30 @@ def get_status():
     return None
 
 # --- Function to add trend data ---
+# Each zone keeps a columnar ring buffer: epoch seconds in "t", densities in "d".
 def update_trend(zone_id, density):
-    if zone_id not in st.session_state.history:
-        st.session_state.history[zone_id] = []
-    st.session_state.history[zone_id].append({
-        "time": datetime.now().strftime("%H:%M:%S"),
-        "density": density,
-    })
-    if len(st.session_state.history[zone_id]) > MAX_HISTORY:
-        st.session_state.history[zone_id] = st.session_state.history[zone_id][-MAX_HISTORY:]
+    h = st.session_state.history.get(zone_id)
+    if h is None:
+        h = st.session_state.history[zone_id] = {
+            "t": np.empty(MAX_HISTORY, "f8"),
+            "d": np.empty(MAX_HISTORY, "f4"),
+            "idx": 0,
+            "n": 0,
+        }
+    i = h["idx"] % MAX_HISTORY
+    h["t"][i] = time.time()
+    h["d"][i] = density
+    h["idx"] += 1
+    h["n"] = min(h["n"] + 1, MAX_HISTORY)
+
+# --- Function to build the trend chart data (oldest first) ---
+def trend_frame(zone_id):
+    h = st.session_state.history.get(zone_id)
+    if h is None or h["n"] == 0:
+        return pd.DataFrame()
+    order = (h["idx"] - np.arange(h["n"], 0, -1)) % MAX_HISTORY
+    times = pd.to_datetime(h["t"][order], unit="s", utc=True).tz_convert(LOCAL_TZ)
+    return pd.DataFrame({"time": times, "density": h["d"][order]})
 
 # ==============================================================================
 # --- SIDEBAR ---
@@ -113,6 +136,40 @@ dashboard_placeholder = tab_dashboard.empty()
 trends_placeholder = tab_trends.empty()
 alerts_placeholder = tab_alerts.empty()
 
+# --- Map data, built once; only density changes per refresh ---
+DEFAULT_COORDS = {"lat": 17.38, "lon": 78.49}
+_MAP_DF = pd.DataFrame([
+    {"zone_id": zid, "lat": c["lat"], "lon": c["lon"], "density": 0.0}
+    for zid, c in ZONE_COORDS.items()
+]).set_index("zone_id")
+
+# --- ENHANCEMENT: 3D Hexagon Heatmap (static parts; only layer data changes per refresh) ---
+_VIEW = pdk.ViewState(
+    latitude=17.3868, 
+    longitude=78.4910, 
+    zoom=16, 
+    pitch=50 # 3D Angle
+)
+_TOOLTIP = {"html": "<b>Density:</b> {elevationValue}%"}
+_HEX_LAYER = pdk.Layer(
+    "HexagonLayer",
+    data=_MAP_DF.reset_index(drop=True),
+    get_position="[lon, lat]",
+    get_elevation="density * 100", # Height of the bar
+    get_fill_color="[255, (1-density)*255, 0, 150]", # Red = high
+    radius=30,
+    elevation_scale=1,
+    elevation_range=[0, 100],
+    pickable=True,
+    extruded=True,
+)
+_DECK = pdk.Deck(
+    map_style="mapbox://styles/mapbox/dark-v9",
+    initial_view_state=_VIEW,
+    layers=[_HEX_LAYER],
+    tooltip=_TOOLTIP,
+)
+
 while True:
     data = get_status()
     
@@ -156,43 +213,16 @@ while True:
             st.subheader("🗺️ Live Density Heatmap")
             
             # --- Prep data for the map ---
-            map_data_list = []
             for z in zones:
-                coords = ZONE_COORDS.get(z["zone_id"], {"lat": 17.38, "lon": 78.49})
-                map_data_list.append({
-                    "lat": coords["lat"],
-                    "lon": coords["lon"],
-                    "density": z["density"],
-                })
-            map_data = pd.DataFrame(map_data_list)
+                if z["zone_id"] in _MAP_DF.index:
+                    _MAP_DF.loc[z["zone_id"], "density"] = z["density"]
+                else:
+                    _MAP_DF.loc[z["zone_id"]] = [DEFAULT_COORDS["lat"], DEFAULT_COORDS["lon"], z["density"]]
+            map_data = _MAP_DF.loc[[z["zone_id"] for z in zones]].reset_index(drop=True)
 
             # --- ENHANCEMENT: 3D Hexagon Heatmap ---
-            st.pydeck_chart(
-                pdk.Deck(
-                    map_style="mapbox://styles/mapbox/dark-v9",
-                    initial_view_state=pdk.ViewState(
-                        latitude=17.3868, 
-                        longitude=78.4910, 
-                        zoom=16, 
-                        pitch=50 # 3D Angle
-                    ),
-                    layers=[
-                        pdk.Layer(
-                            "HexagonLayer",
-                            data=map_data,
-                            get_position="[lon, lat]",
-                            get_elevation="density * 100", # Height of the bar
-                            get_fill_color="[255, (1-density)*255, 0, 150]", # Red = high
-                            radius=30,
-                            elevation_scale=1,
-                            elevation_range=[0, 100],
-                            pickable=True,
-                            extruded=True,
-                        ),
-                    ],
-                    tooltip={"html": "<b>Density:</b> {elevationValue}%"}
-                )
-            )
+            _HEX_LAYER.data = map_data
+            st.pydeck_chart(_DECK)
 
         with col_info:
             st.subheader("📊 Zone Status")
@@ -246,7 +276,7 @@ while True:
         
         for i, z in enumerate(zones):
             with chart_cols[i]:
-                df = pd.DataFrame(st.session_state.history.get(z["zone_id"], []))
+                df = trend_frame(z["zone_id"])
                 st.markdown(f"**{z['display_name']}**")
                 if not df.empty:
                     st.area_chart(df.set_index("time"), y="density", height=250, use_container_width=True)
@@ -1,15 +1,25 @@
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import datetime
 import random
+import numpy as np
 import json
 import csv
 import os
+import atexit
 
 # --- Configuration ---
 # This is the endpoint Person B is building.
 # Make sure the port matches (e.g., 8000 for FastAPI).
 INGEST_ENDPOINT = "http://localhost:8000/api/ingest"
+BULK_URL = INGEST_ENDPOINT + "/bulk"
+
+# Reuse pooled keep-alive connections across ticks instead of reconnecting per POST
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
 
 # --- Prepare to log data for AI training ---
 LOG_FILE = "crowd_data_log.csv"
@@ -20,6 +30,11 @@ if not os.path.exists(LOG_FILE):
         writer = csv.writer(f)
         writer.writerow(["timestamp", "zone", "count"])
 
+# Keep the log open for the process lifetime (line-buffered) instead of reopening every tick
+_LOG_FH = open(LOG_FILE, mode="a", newline="", buffering=1)
+_LOG_WRITER = csv.writer(_LOG_FH)
+atexit.register(_LOG_FH.close)
+
 # --- Our Demo Scenario (The "Story") ---
 # We will simulate 3 minutes of events, sped up.
 #
@@ -30,45 +45,77 @@ if not os.path.exists(LOG_FILE):
 #
 # We'll run this loop every 2 seconds to simulate real-time data.
 
+SCENARIO_SECONDS = 180
+
+
+def _gate_a_phase(t):
+    """
+    Deterministic part of the Gate A story at second t: (base count, noise range, floor).
+    """
+    if 0 <= t < 30:
+        return 90, 10, 0
+    elif 30 <= t < 60:
+        return int(100 + (t - 30) * 5), 10, 0  # (100 -> 250 in 30s)
+    elif 60 <= t < 90:
+        return 275, 25, 0
+    else:
+        return int(250 - (t - 90) * 1.1), 10, 150  # (250 -> 151 in 90s)
+
+
+# Precompute the whole scenario once; each tick is then a lookup plus noise.
+_SCHEDULE_A = np.zeros((SCENARIO_SECONDS + 1, 3), dtype=np.int32)  # cam_01: base, noise, floor
+for _t in range(SCENARIO_SECONDS + 1):
+    _SCHEDULE_A[_t] = _gate_a_phase(_t)
+_SCHEDULE_B = np.full((SCENARIO_SECONDS + 1, 3), (120, 10, 0), dtype=np.int32)  # cam_02: steady
+
+
+def _scheduled_count(schedule, t):
+    base, noise, floor = schedule[t].tolist()
+    return max(floor, base + random.randint(-noise, noise))
+
+
 def get_crowd_count(simulation_time_sec):
     """
     Generates a crowd count based on our demo scenario.
     This function IS the "story".
     """
+    # Ticks that land just past the end hold the final second until the loop restarts
+    t = min(int(simulation_time_sec), SCENARIO_SECONDS)
+
     # --- cam_01 (Main Gate A) ---
-    if 0 <= simulation_time_sec < 30:
-        count_gate_a = random.randint(80, 100)
-    elif 30 <= simulation_time_sec < 60:
-        base_count = 100 + (simulation_time_sec - 30) * 5  # (100 -> 250 in 30s)
-        count_gate_a = int(base_count) + random.randint(-10, 10)
-    elif 60 <= simulation_time_sec < 90:
-        count_gate_a = random.randint(250, 300)
-    else:
-        base_count = 250 - (simulation_time_sec - 90) * 1.1  # (250 -> 151 in 90s)
-        count_gate_a = max(150, int(base_count) + random.randint(-10, 10))
+    count_gate_a = _scheduled_count(_SCHEDULE_A, t)
 
     # --- cam_02 (Stage Front) ---
-    count_stage_front = random.randint(110, 130)
+    count_stage_front = _scheduled_count(_SCHEDULE_B, t)
 
     return count_gate_a, count_stage_front
 
 
-def send_data(source_id, count):
+def make_payload(source_id, count):
     """
-    Formats and sends the data payload to the ingestion endpoint.
+    Formats a single reading for the ingestion endpoint.
     """
-    payload = {
+    return {
         "source_id": source_id,
         "source_type": "camera",
         "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
         "data": {"count": count},
     }
 
+
+def send_data(counts):
+    """
+    Sends all readings for one tick to the bulk ingestion endpoint in a single POST.
+    `counts` maps source_id -> count.
+    """
+    payload = [make_payload(source_id, count) for source_id, count in counts.items()]
+
     try:
-        response = requests.post(INGEST_ENDPOINT, json=payload, timeout=1.0)
-        print(f"Sent: {source_id}, Count: {count}. Response: {response.status_code}")
+        response = _SESSION.post(BULK_URL, json=payload, timeout=1.0)
+        sent = ", ".join(f"{source_id}: {count}" for source_id, count in counts.items())
+        print(f"Sent: {sent}. Response: {response.status_code}")
     except requests.exceptions.ConnectionError:
-        print(f"Error: Connection to {INGEST_ENDPOINT} refused. Is Person B's server running?")
+        print(f"Error: Connection to {BULK_URL} refused. Is Person B's server running?")
     except requests.exceptions.RequestException as e:
         print(f"Error sending data: {e}")
 
@@ -76,7 +123,7 @@ def send_data(source_id, count):
 # --- Main Simulation Loop ---
 def run_simulation():
     print("--- Starting Crowd Safety Simulator ---")
-    print(f"Sending data to: {INGEST_ENDPOINT}")
+    print(f"Sending data to: {BULK_URL}")
 
     start_time = time.time()
 
@@ -85,14 +132,15 @@ def run_simulation():
         count_a, count_b = get_crowd_count(simulation_time)
 
         # Send the data to backend
-        send_data("cam_01", count_a)  # Main Gate A
-        send_data("cam_02", count_b)  # Stage Front
+        send_data({
+            "cam_01": count_a,  # Main Gate A
+            "cam_02": count_b,  # Stage Front
+        })
 
         # --- Log data locally for AI training ---
-        with open(LOG_FILE, mode="a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([datetime.datetime.now().isoformat(), "gate_a", count_a])
-            writer.writerow([datetime.datetime.now().isoformat(), "stage_front", count_b])
+        now = datetime.datetime.now().isoformat()
+        _LOG_WRITER.writerow([now, "gate_a", count_a])
+        _LOG_WRITER.writerow([now, "stage_front", count_b])
 
         # Restart simulation after 3 minutes
         if simulation_time > 180: